@@ -1,25 +1,34 @@
 #!/usr/bin/env python3
-"""create_with_openpyxl.py - openpyxlでスピル関数ファイルを作成"""
+"""create_with_openpyxl.py - openpyxlでスピル関数ファイルを作成
+
+既定ではシート構成が固定なので、XMLを直接ZIPに書き出して高速に生成する。
+`--openpyxl` を付けるとopenpyxl経由で生成する。
+`--wolfxl` を付けると、openpyxl経由の生成でデータ行の書き込みにRust実装のwolfxlを使う
+（未インストールや非互換の場合はopenpyxlに戻る）。
+`--validate` を付けると直接生成したファイルをopenpyxlで読み戻して確認し、
+想定と異なればopenpyxl経由で作り直す（読み戻しの分だけ遅くなる）。
+`--static` を付けるとSPILL関数の結果をPythonで事前計算し、値として書き込む
+（再計算なしで読めるため、Excelを介さないパイプライン向け）。
+"""
 
 import sys
 import os
+import re
+import zipfile
+from itertools import groupby
+from xml.sax.saxutils import escape
 
 # ローカルの修正済みopenpyxlを使用（必要に応じてパスを調整）
 # sys.path.insert(0, os.path.abspath('/workspace/openpyxl'))
 
-from openpyxl import Workbook
-from datetime import date
-
-print("Creating Excel file with SPILL functions using openpyxl...")
-
-# ワークブックを作成
-wb = Workbook()
-ws = wb.active
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import coordinate_to_tuple, get_column_letter
+from openpyxl.worksheet.formula import ArrayFormula
+from datetime import date, datetime
+import tempfile
 
 # サンプルデータ
-ws['A1'] = 'Date'
-ws['B1'] = 'Sales'
-ws['C1'] = 'Region'
+header = ['Date', 'Sales', 'Region']
 
 data = [
     (date(2024, 1, 1), 1500, 'North'),
@@ -31,55 +40,326 @@ data = [
     (date(2024, 1, 7), 1700, 'East'),
 ]
 
-# データを書き込み
-for row, (dt, sales, region) in enumerate(data, start=2):
-    ws[f'A{row}'] = dt
-    ws[f'B{row}'] = sales
-    ws[f'C{row}'] = region
-
-# SPILL関数の追加（範囲が重ならないように配置）
-print("\nAdding SPILL functions with non-overlapping ranges...")
-
-# 分析セクションのヘッダー
-ws['E1'] = 'Analysis with SPILL Functions'
-
-# 1. SORT - 列F（F3から下へスピル）
-ws['E3'] = 'Top Sales (Sorted):'
-cell = ws['F3']
-cell.value = '=SORT(B2:B8,,-1)'
-cell.set_dynamic_array_formula('F3:F9')
-print("✓ SORT formula added (F3:F9)")
-
-# 2. UNIQUE - 列H（H3から下へスピル）
-ws['E12'] = 'Unique Regions:'
-cell = ws['F12']
-cell.value = '=UNIQUE(C2:C8)'
-cell.set_dynamic_array_formula('F12:F14')
-print("✓ UNIQUE formula added (F12:F14)")
-
-# 3. FILTER (North) - 列J（J3から下へスピル）
-ws['I3'] = 'North Sales:'
-cell = ws['J3']
-cell.value = '=FILTER(B2:B8,C2:C8="North")'
-cell.set_dynamic_array_formula('J3:J5')
-print("✓ FILTER formula added (J3:J5)")
-
-# 4. FILTER (>2000) - 複数列、行17から（A17:C19）
-ws['A16'] = 'Sales > 2000:'
-cell = ws['A17']
-cell.value = '=FILTER(A2:C8,B2:B8>2000)'
-cell.set_dynamic_array_formula('A17:C19')
-print("✓ FILTER formula added (A17:C19) - multi-column")
-
-# 5. SEQUENCE - 列E、行20から（E20:E26）
-ws['D20'] = 'Numbers:'
-cell = ws['E20']
-cell.value = '=SEQUENCE(7)'
-cell.set_dynamic_array_formula('E20:E26')
-print("✓ SEQUENCE formula added (E20:E26)")
-
-# ワークブックを保存
-output_path = os.path.join(os.path.dirname(__file__), 'openpyxl_spill_generated.xlsx')
-wb.save(output_path)
-
-print(f"\n✓ openpyxl file created: {output_path}")
\ No newline at end of file
+# 見出しラベル（セル, 値）
+labels = [
+    ('E1', 'Analysis with SPILL Functions'),
+    ('E3', 'Top Sales (Sorted):'),
+    ('E12', 'Unique Regions:'),
+    ('I3', 'North Sales:'),
+    ('A16', 'Sales > 2000:'),
+    ('D20', 'Numbers:'),
+]
+
+# SPILL関数（範囲が重ならないように配置）: (スピル範囲, 数式, 表示名)
+spill_formulas = [
+    ('F3:F9', '=SORT(B2:B8,,-1)', 'SORT'),                          # 1. 列F（F3から下へスピル）
+    ('F12:F14', '=UNIQUE(C2:C8)', 'UNIQUE'),                        # 2. 列F（F12から下へスピル）
+    ('J3:J5', '=FILTER(B2:B8,C2:C8="North")', 'FILTER'),            # 3. 列J（J3から下へスピル）
+    ('A17:C19', '=FILTER(A2:C8,B2:B8>2000)', 'FILTER'),             # 4. 複数列、行17から
+    ('E20:E26', '=SEQUENCE(7)', 'SEQUENCE'),                        # 5. 列E、行20から
+]
+
+# 出力モード: "formula"=SPILL関数を書き込む / "static"=計算結果を値として書き込む
+MODE = "formula"
+
+
+def compute_static_values():
+    """SPILL関数の結果をPythonで事前計算する（スピル範囲 -> 行のリスト）"""
+    sales = [s for _, s, _ in data]
+    regions = [r for _, _, r in data]
+    return {
+        'F3:F9': [(s,) for s in sorted(sales, reverse=True)],
+        'F12:F14': [(r,) for r in dict.fromkeys(regions)],
+        'J3:J5': [(s,) for _, s, r in data if r == 'North'],
+        'A17:C19': [row for row in data if row[1] > 2000],
+        'E20:E26': [(n,) for n in range(1, 8)],
+    }
+
+
+def _iter_static_cells():
+    """事前計算した値を (行, 列, 値) の形で返す"""
+    for spill_range, rows in compute_static_values().items():
+        start_row, start_col = coordinate_to_tuple(spill_range.split(':')[0])
+        for row_idx, values in enumerate(rows, start=start_row):
+            for col_idx, value in enumerate(values, start=start_col):
+                yield row_idx, col_idx, value
+
+
+def _stream_rows(workbook_cls, path):
+    """write_onlyモードでヘッダーとデータ行をストリーム書き込み"""
+    stream_wb = workbook_cls(write_only=True)
+    stream_ws = stream_wb.create_sheet()
+    stream_ws.append(header)
+    for row in data:
+        stream_ws.append(row)
+    stream_wb.save(path)
+
+
+def create_with_openpyxl(output_path, mode=MODE, use_wolfxl=False):
+    """openpyxlで生成（write_onlyでデータを流し込み、通常モードでSPILL関数を設定）"""
+    # フェーズ1: write_onlyモードでデータ行をストリーム書き込み
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(tmp_fd)
+    if use_wolfxl:
+        # wolfxl（openpyxl互換のRust実装）は明示的に指定された場合のみ使う
+        try:
+            from wolfxl import Workbook as StreamWorkbook
+        except ImportError as e:
+            print(f"wolfxl unavailable ({e}), falling back to openpyxl...")
+            use_wolfxl = False
+        else:
+            try:
+                _stream_rows(StreamWorkbook, tmp_path)
+            except (TypeError, AttributeError, NotImplementedError) as e:
+                # write_only等のopenpyxl APIに未対応のバージョンのみフォールバックし、
+                # それ以外のエラーはそのまま送出する
+                print(f"wolfxl incompatible ({e}), falling back to openpyxl...")
+                use_wolfxl = False
+    if not use_wolfxl:
+        _stream_rows(Workbook, tmp_path)
+
+    # フェーズ2: openpyxlの通常モードで開き直してSPILL関数を設定
+    # （write_onlyモードやwolfxlではset_dynamic_array_formulaを使えないため）
+    wb = load_workbook(tmp_path)
+    os.remove(tmp_path)
+    ws = wb.active
+
+    for ref, value in labels:
+        ws[ref] = value
+
+    if mode == "static":
+        for row, col, value in _iter_static_cells():
+            ws.cell(row=row, column=col, value=value)
+    else:
+        for spill_range, formula, _ in spill_formulas:
+            cell = ws[spill_range.split(':')[0]]
+            cell.value = formula
+            cell.set_dynamic_array_formula(spill_range)
+
+    wb.save(output_path)
+
+
+# ---------------------------------------------------------------------------
+# XML直接生成
+# ---------------------------------------------------------------------------
+
+# Excelが要求する将来関数のプレフィックス（openpyxl-spillが付与するものと同じ）
+_XLFN_PREFIXES = {
+    'SORT': '_xlfn._xlws.',
+    'FILTER': '_xlfn._xlws.',
+    'UNIQUE': '_xlfn.',
+    'SEQUENCE': '_xlfn.',
+}
+_XLFN_RE = re.compile(r'\b(' + '|'.join(_XLFN_PREFIXES) + r')\(')
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '<Override PartName="/xl/metadata.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheetMetadata+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet" sheetId="1" r:id="rId1"/></sheets>'
+    '<calcPr calcId="124519" fullCalcOnLoad="1"/>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sheetMetadata" Target="metadata.xml"/>'
+    '</Relationships>'
+)
+
+# スタイル: 0=標準, 1=日付(yyyy-mm-dd)
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd h:mm:ss"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+# 動的配列数式（cm="1"）が参照するメタデータ
+_METADATA_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<metadata xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ' xmlns:xda="http://schemas.microsoft.com/office/spreadsheetml/2017/dynamicarray">'
+    '<metadataTypes count="1"><metadataType name="XLDAPR" minSupportedVersion="120000" copy="1"'
+    ' pasteAll="1" pasteValues="1" merge="1" splitFirst="1" rowColShift="1" clearFormats="1"'
+    ' clearComments="1" assign="1" coerce="1" cellMeta="1"/></metadataTypes>'
+    '<futureMetadata name="XLDAPR" count="1"><bk><extLst>'
+    '<ext uri="{bdbb8cdc-fa1e-496e-a857-3c3f30c029c3}">'
+    '<xda:dynamicArrayProperties fDynamic="1" fCollapsed="0"/>'
+    '</ext></extLst></bk></futureMetadata>'
+    '<cellMetadata count="1"><bk><rc t="1" v="0"/></bk></cellMetadata>'
+    '</metadata>'
+)
+
+_SHEET_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<dimension ref="{dimension}"/>'
+    '<sheetData>{rows}</sheetData>'
+    '</worksheet>'
+)
+
+
+def _value_cell_xml(ref, value):
+    """1セル分の<c>要素（文字列はinlineStr、日付・日時はシリアル値+日付スタイル）
+
+    Noneは空セルとして扱うため呼び出し側で除外する。
+    """
+    if isinstance(value, str):
+        return f'<c r="{ref}" t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+    # boolはintのサブクラス、datetimeはdateのサブクラスなので先に判定する
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c r="{ref}" s="2"><v>{serial!r}</v></c>'
+    if isinstance(value, date):
+        return f'<c r="{ref}" s="1"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    raise TypeError(f"Unsupported cell value type for {ref}: {type(value).__name__}")
+
+
+def _spill_cell_xml(ref, spill_range, formula):
+    """動的配列数式の<c>要素（t="array"とcm="1"でスピルとして扱われる）"""
+    text = _XLFN_RE.sub(lambda m: _XLFN_PREFIXES[m.group(1)] + m.group(0), formula.lstrip('='))
+    return f'<c r="{ref}" cm="1"><f t="array" ref="{spill_range}">{escape(text)}</f><v>0</v></c>'
+
+
+def _build_sheet_xml(mode=MODE):
+    """シートXMLを組み立てる"""
+    cells = {}
+
+    def put(row, col, value):
+        if value is not None:
+            cells[(row, col)] = _value_cell_xml(f'{get_column_letter(col)}{row}', value)
+
+    for col, value in enumerate(header, start=1):
+        put(1, col, value)
+    for row, values in enumerate(data, start=2):
+        for col, value in enumerate(values, start=1):
+            put(row, col, value)
+    for ref, value in labels:
+        put(*coordinate_to_tuple(ref), value)
+    if mode == "static":
+        for row, col, value in _iter_static_cells():
+            put(row, col, value)
+    else:
+        for spill_range, formula, _ in spill_formulas:
+            ref = spill_range.split(':')[0]
+            cells[coordinate_to_tuple(ref)] = _spill_cell_xml(ref, spill_range, formula)
+
+    # キーを一度だけソートし、行ごとにまとめる
+    rows = []
+    for row, keys in groupby(sorted(cells), key=lambda k: k[0]):
+        row_cells = ''.join(cells[key] for key in keys)
+        rows.append(f'<row r="{row}">{row_cells}</row>')
+
+    max_row = max(r for r, _ in cells)
+    max_col = max(c for _, c in cells)
+    dimension = f'A1:{get_column_letter(max_col)}{max_row}'
+    return _SHEET_XML.format(dimension=dimension, rows=''.join(rows))
+
+
+def create_with_zipfile(output_path, mode=MODE):
+    """OOXMLパーツを直接ZIPに書き出して生成"""
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES_XML)
+        zf.writestr('_rels/.rels', _ROOT_RELS_XML)
+        zf.writestr('xl/workbook.xml', _WORKBOOK_XML)
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS_XML)
+        zf.writestr('xl/styles.xml', _STYLES_XML)
+        zf.writestr('xl/metadata.xml', _METADATA_XML)
+        zf.writestr('xl/worksheets/sheet1.xml', _build_sheet_xml(mode))
+
+
+def validate_spill_file(path):
+    """openpyxlで読み戻し、各SPILL関数が配列数式として入っているか確認"""
+    # 確認は読み取りだけなのでread_onlyで開き、値はiter_rowsでまとめて取り出す
+    wb = load_workbook(path, read_only=True)
+    try:
+        values = {
+            cell.coordinate: cell.value
+            for row in wb.active.iter_rows()
+            for cell in row
+            if cell.value is not None
+        }
+    finally:
+        wb.close()
+
+    for spill_range, _, _ in spill_formulas:
+        value = values.get(spill_range.split(':')[0])
+        if not isinstance(value, ArrayFormula) or value.ref != spill_range:
+            return False
+    return True
+
+
+def _create_with_openpyxl_or_exit(output_path, mode, use_wolfxl=False):
+    """openpyxl経由で生成し、openpyxl-spillが無ければメッセージを出して終了"""
+    try:
+        create_with_openpyxl(output_path, mode, use_wolfxl)
+    except AttributeError as e:
+        if "set_dynamic_array_formula" not in str(e):
+            raise
+        print("Error: This feature requires openpyxl-spill library. Please ensure it's properly installed.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    output_path = os.path.join(os.path.dirname(__file__), 'openpyxl_spill_generated.xlsx')
+    mode = "static" if '--static' in sys.argv[1:] else MODE
+    use_wolfxl = '--wolfxl' in sys.argv[1:]
+
+    if '--openpyxl' in sys.argv[1:]:
+        print("Creating Excel file with SPILL functions using openpyxl...")
+        _create_with_openpyxl_or_exit(output_path, mode, use_wolfxl)
+    else:
+        print("Creating Excel file with SPILL functions by writing XML directly...")
+        create_with_zipfile(output_path, mode)
+        if mode == "formula" and '--validate' in sys.argv[1:] and not validate_spill_file(output_path):
+            # 直接生成の結果が想定と異なる場合はopenpyxl経由で作り直す
+            print("Direct XML output failed validation, falling back to openpyxl...")
+            _create_with_openpyxl_or_exit(output_path, mode, use_wolfxl)
+
+    for spill_range, _, name in spill_formulas:
+        if mode == "static":
+            print(f"✓ {name} results written as values ({spill_range})")
+        else:
+            print(f"✓ {name} formula added ({spill_range})")
+
+    print(f"\n✓ Excel file created: {output_path}")
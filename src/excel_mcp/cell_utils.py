@@ -2,6 +2,8 @@ import re
 
 from openpyxl.utils import column_index_from_string
 
+_CELL_REF_RE = re.compile(r"^([A-Za-z]{1,3})([0-9]+)$")
+
 def parse_cell_range(
     cell_ref: str,
     end_ref: str | None = None
@@ -34,6 +36,17 @@ def parse_cell_range(
 
     return start_row, start_col, end_row, end_col
 
+def parse_cell_reference(cell_ref: str) -> tuple[int, int]:
+    """Parse a single Excel cell reference (e.g., 'B12') into row and column indices."""
+    match = _CELL_REF_RE.match(cell_ref)
+    if not match:
+        raise ValueError(f"Invalid cell reference: {cell_ref}")
+    col_str, row_str = match.groups()
+    col = 0
+    for ch in col_str.upper():
+        col = col * 26 + (ord(ch) - 64)
+    return int(row_str), col
+
 def validate_cell_reference(cell_ref: str) -> bool:
     """Validate Excel cell reference format (e.g., 'A1', 'BC123')"""
     if not cell_ref:
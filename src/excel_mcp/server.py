@@ -620,7 +620,17 @@ def apply_spill_formula(
     try:
         full_path = get_excel_path(filepath)
         from excel_mcp.workbook import get_or_create_workbook
-        from openpyxl.utils import coordinate_to_tuple
+        from excel_mcp.cell_utils import parse_cell_reference
+        
+        # Validate cell references before opening the workbook
+        try:
+            start_row, start_col = parse_cell_reference(start_cell)
+            end_row, end_col = parse_cell_reference(end_cell)
+            
+            if start_row > end_row or start_col > end_col:
+                return "Error: Invalid range specification: start_cell must be before end_cell"
+        except ValueError:
+            return f"Error: Invalid cell reference"
         
         # Open workbook
         wb = get_or_create_workbook(full_path)
@@ -630,16 +640,6 @@ def apply_spill_formula(
             return f"Error: Sheet '{sheet_name}' not found"
         sheet = wb[sheet_name]
         
-        # Validate cell references
-        try:
-            start_row, start_col = coordinate_to_tuple(start_cell)
-            end_row, end_col = coordinate_to_tuple(end_cell)
-            
-            if start_row > end_row or start_col > end_col:
-                return "Error: Invalid range specification: start_cell must be before end_cell"
-        except ValueError:
-            return f"Error: Invalid cell reference"
-        
         # Set formula in start cell
         cell = sheet[start_cell]
         cell.value = formula
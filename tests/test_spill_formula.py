@@ -1,9 +1,13 @@
 """Tests for apply_spill_formula MCP tool"""
 import pytest
+import functools
 import os
-import tempfile
+import re
+import shutil
+from contextlib import contextmanager
 from pathlib import Path
 import sys
+import zipfile
 
 # Add the parent directory to the path so we can import excel_mcp
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
@@ -12,16 +16,24 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 os.environ.setdefault('EXCEL_FILES_PATH', '/tmp/excel_files')
 
 import openpyxl
+import openpyxl.writer.excel
 from openpyxl import Workbook
 from openpyxl.utils import coordinate_to_tuple
 from datetime import date
 
+from excel_mcp.cell_utils import parse_cell_reference
+
+
+@functools.lru_cache(maxsize=None)
+def _ensure_base(base_path: str) -> str:
+    """Create the Excel files directory once per distinct path"""
+    os.makedirs(base_path, exist_ok=True)
+    return base_path
+
 
 def get_excel_path(filename: str) -> str:
     """Get the full path for an Excel file"""
-    base_path = os.environ.get('EXCEL_FILES_PATH', '/tmp/excel_files')
-    os.makedirs(base_path, exist_ok=True)
-    return os.path.join(base_path, filename)
+    return os.path.join(_ensure_base(os.environ.get('EXCEL_FILES_PATH', '/tmp/excel_files')), filename)
 
 
 def create_workbook(filename: str) -> str:
@@ -30,30 +42,52 @@ def create_workbook(filename: str) -> str:
         full_path = get_excel_path(filename)
         wb = Workbook()
         wb.save(full_path)
-        wb.close()
         return f"Workbook created successfully at {full_path}"
     except Exception as e:
         return f"Error creating workbook: {str(e)}"
 
 
-def write_data_to_excel(filepath: str, sheet_name: str, start_cell: str, data: list) -> str:
+def write_data_to_excel(wb: Workbook, sheet_name: str, start_cell: str, data: list) -> Workbook:
+    """Write data to an open workbook without saving it"""
+    if sheet_name not in wb.sheetnames:
+        wb.create_sheet(sheet_name)
+    sheet = wb[sheet_name]
+    
+    start_row, start_col = coordinate_to_tuple(start_cell)
+    
+    # Rows that continue directly below existing data can be appended.
+    # Worksheet.append writes at _current_row + 1, which only matches
+    # max_row + 1 once the sheet holds cells (max_row is 1 on an empty sheet).
+    if (
+        start_col == 1
+        and sheet._cells
+        and sheet._current_row == sheet.max_row
+        and start_row == sheet._current_row + 1
+    ):
+        for row_data in data:
+            sheet.append(row_data)
+        return wb
+    
+    # sheet.cell with integer indices is faster than coordinate-string
+    # assignment (sheet["A1"] = ...), which re-parses every key. The sheet's
+    # dimensions are computed lazily from its cells, so there is nothing to
+    # pre-size; touching the bottom-right cell first would only add an empty
+    # cell when the last row is short.
+    set_cell = sheet.cell
+    for row_idx, row_data in enumerate(data, start=start_row):
+        for col_idx, value in enumerate(row_data, start=start_col):
+            set_cell(row_idx, col_idx, value)
+    
+    return wb
+
+
+def write_data_to_excel_path(filepath: str, sheet_name: str, start_cell: str, data: list) -> str:
     """Write data to Excel file"""
     try:
         full_path = get_excel_path(filepath)
         wb = openpyxl.load_workbook(full_path)
-        
-        if sheet_name not in wb.sheetnames:
-            wb.create_sheet(sheet_name)
-        sheet = wb[sheet_name]
-        
-        start_row, start_col = coordinate_to_tuple(start_cell)
-        
-        for row_idx, row_data in enumerate(data):
-            for col_idx, value in enumerate(row_data):
-                sheet.cell(row=start_row + row_idx, column=start_col + col_idx, value=value)
-        
+        write_data_to_excel(wb, sheet_name, start_cell, data)
         wb.save(full_path)
-        wb.close()
         return f"Data written successfully"
     except Exception as e:
         return f"Error writing data: {str(e)}"
@@ -68,6 +102,16 @@ def apply_spill_formula(
 ) -> str:
     """Apply dynamic array formula to specified range."""
     try:
+        # Validate cell references before paying for the workbook load
+        try:
+            start_row, start_col = parse_cell_reference(start_cell)
+            end_row, end_col = parse_cell_reference(end_cell)
+            
+            if start_row > end_row or start_col > end_col:
+                return "Error: Invalid range specification: start_cell must be before end_cell"
+        except ValueError:
+            return f"Error: Invalid cell reference"
+        
         full_path = get_excel_path(filepath)
         
         # Open workbook
@@ -78,16 +122,6 @@ def apply_spill_formula(
             return f"Error: Sheet '{sheet_name}' not found"
         sheet = wb[sheet_name]
         
-        # Validate cell references
-        try:
-            start_row, start_col = coordinate_to_tuple(start_cell)
-            end_row, end_col = coordinate_to_tuple(end_cell)
-            
-            if start_row > end_row or start_col > end_col:
-                return "Error: Invalid range specification: start_cell must be before end_cell"
-        except ValueError:
-            return f"Error: Invalid cell reference"
-        
         # Set formula in start cell
         cell = sheet[start_cell]
         cell.value = formula
@@ -102,7 +136,6 @@ def apply_spill_formula(
         
         # Save workbook
         wb.save(full_path)
-        wb.close()
         
         return f"Applied dynamic array formula '{formula}' to range {range_str}"
         
@@ -110,71 +143,185 @@ def apply_spill_formula(
         return f"Error applying spill formula: {str(e)}"
 
 
-class TestApplySpillFormula:
-    """Test suite for apply_spill_formula function"""
+@contextmanager
+def defer_spill_refresh(sheet):
+    """Set spill formulas on a sheet and register their ranges on exit.
     
-    @pytest.fixture
-    def temp_excel_dir(self):
-        """Create a temporary directory for test Excel files"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Set up the environment variable for EXCEL_FILES_PATH
-            original_path = os.environ.get('EXCEL_FILES_PATH')
-            os.environ['EXCEL_FILES_PATH'] = tmpdir
-            yield tmpdir
-            # Restore original environment variable
-            if original_path:
-                os.environ['EXCEL_FILES_PATH'] = original_path
-            else:
-                del os.environ['EXCEL_FILES_PATH']
+    Yields add(start_cell, end_cell, formula), which writes the formula
+    value immediately and queues the spill range. The array formula
+    metadata is then built in one pass after all values are in place.
+    """
+    pending = []
     
-    @pytest.fixture
-    def test_excel_file(self, temp_excel_dir):
-        """Create a test Excel file with sample data"""
-        filename = "test_spill.xlsx"
+    def add(start_cell: str, end_cell: str, formula: str) -> str:
+        cell = sheet[start_cell]
+        cell.value = formula
+        range_str = f"{start_cell}:{end_cell}"
+        pending.append((cell, range_str))
+        return range_str
+    
+    yield add
+    for cell, range_str in pending:
+        cell.set_dynamic_array_formula(range_str)
+
+
+def apply_spill_formulas_batch(filepath: str, sheet_name: str, specs: list) -> str:
+    """Apply several dynamic array formulas under a single load/save cycle.
+    
+    specs is a list of (start_cell, end_cell, formula) tuples.
+    """
+    try:
+        # Validate all cell references before paying for the workbook load
+        for start_cell, end_cell, formula in specs:
+            try:
+                start_row, start_col = parse_cell_reference(start_cell)
+                end_row, end_col = parse_cell_reference(end_cell)
+                
+                if start_row > end_row or start_col > end_col:
+                    return "Error: Invalid range specification: start_cell must be before end_cell"
+            except ValueError:
+                return f"Error: Invalid cell reference"
         
-        # Create workbook
-        result = create_workbook(filename)
-        assert "successfully" in result
+        full_path = get_excel_path(filepath)
         
-        # Add sample data for testing UNIQUE function
-        write_data_to_excel(
-            filename,
-            "Sheet",
-            "A1",
-            [
-                ["Apple"],
-                ["Banana"],
-                ["Apple"],
-                ["Cherry"],
-                ["Banana"],
-                ["Date"],
-                ["Apple"],
-                ["Elderberry"],
-                ["Fig"],
-                ["Cherry"]
-            ]
-        )
+        # Open workbook
+        wb = openpyxl.load_workbook(full_path)
         
-        # Add sample data for testing SORT function
-        write_data_to_excel(
-            filename,
-            "Sheet",
-            "B1",
-            [
-                ["Name", "Score"],
-                ["Alice", 85],
-                ["Bob", 92],
-                ["Charlie", 78],
-                ["David", 88],
-                ["Eve", 95],
-                ["Frank", 82],
-                ["Grace", 90],
-                ["Henry", 75],
-                ["Ivy", 93]
-            ]
-        )
+        # Check if sheet exists
+        if sheet_name not in wb.sheetnames:
+            return f"Error: Sheet '{sheet_name}' not found"
+        sheet = wb[sheet_name]
         
-        return filename
+        messages = []
+        try:
+            with defer_spill_refresh(sheet) as add_spill:
+                for start_cell, end_cell, formula in specs:
+                    range_str = add_spill(start_cell, end_cell, formula)
+                    messages.append(f"Applied dynamic array formula '{formula}' to range {range_str}")
+        except AttributeError as e:
+            # Fallback if set_dynamic_array_formula is not available
+            if "set_dynamic_array_formula" in str(e):
+                return "Error: This feature requires openpyxl-spill library. Please ensure it's properly installed."
+            raise
+        
+        # Save workbook once for all formulas
+        wb.save(full_path)
+        
+        return "\n".join(messages)
+        
+    except Exception as e:
+        return f"Error applying spill formulas: {str(e)}"
+
+
+_NORM_RE = re.compile(r'(\s+|_xlfn\._xlws\.|_xlfn\.)', re.IGNORECASE)
+
+
+def _norm(formula: str) -> str:
+    """Normalize a formula for comparison in a single regex pass"""
+    return _NORM_RE.sub('', formula).upper()
+
+
+def _read_cell_values(ws) -> dict:
+    """Collect non-empty cell values keyed by coordinate in a single pass.
+    
+    Random access on a read-only worksheet re-scans the sheet XML for
+    every lookup, so values are gathered once with iter_rows instead.
+    """
+    return {
+        cell.coordinate: cell.value
+        for row in ws.iter_rows()
+        for cell in row
+        if cell.value is not None
+    }
+
+
+@contextmanager
+def uncompressed_save():
+    """Make openpyxl store workbook parts without zlib compression.
+    
+    Only meant for intermediate test files that are re-read right away;
+    released artifacts should keep the default ZIP_DEFLATED.
+    """
+    original = openpyxl.writer.excel.ZIP_DEFLATED
+    openpyxl.writer.excel.ZIP_DEFLATED = zipfile.ZIP_STORED
+    try:
+        yield
+    finally:
+        openpyxl.writer.excel.ZIP_DEFLATED = original
+
+
+@pytest.fixture
+def temp_excel_dir(tmp_path, monkeypatch):
+    """Point EXCEL_FILES_PATH at the test's own temporary directory"""
+    monkeypatch.setenv('EXCEL_FILES_PATH', str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture(scope="session")
+def template_xlsx(tmp_path_factory):
+    """Build the sample data workbook once per test session"""
+    path = tmp_path_factory.mktemp("tpl") / "test_spill.xlsx"
+    
+    wb = Workbook()
+    
+    # Add sample data for testing UNIQUE function
+    write_data_to_excel(
+        wb,
+        "Sheet",
+        "A1",
+        [
+            ["Apple"],
+            ["Banana"],
+            ["Apple"],
+            ["Cherry"],
+            ["Banana"],
+            ["Date"],
+            ["Apple"],
+            ["Elderberry"],
+            ["Fig"],
+            ["Cherry"]
+        ]
+    )
+    
+    # Add sample data for testing SORT function
+    write_data_to_excel(
+        wb,
+        "Sheet",
+        "B1",
+        [
+            ["Name", "Score"],
+            ["Alice", 85],
+            ["Bob", 92],
+            ["Charlie", 78],
+            ["David", 88],
+            ["Eve", 95],
+            ["Frank", 82],
+            ["Grace", 90],
+            ["Henry", 75],
+            ["Ivy", 93]
+        ]
+    )
+    
+    wb.save(path)
+    
+    return path
+
+
+class TestApplySpillFormula:
+    """Test suite for apply_spill_formula function"""
+    
+    @pytest.fixture(autouse=True)
+    def _uncompressed_saves(self):
+        """Skip zlib for the many intermediate saves made by each test"""
+        with uncompressed_save():
+            yield
+    
+    @pytest.fixture
+    def test_excel_file(self, template_xlsx, temp_excel_dir):
+        """Copy the sample data workbook into the test's directory"""
+        dst = Path(temp_excel_dir) / template_xlsx.name
+        shutil.copy(template_xlsx, dst)
+        return dst.name
     
     def test_apply_unique_formula(self, test_excel_file):
         """Test applying UNIQUE dynamic array formula"""
@@ -291,6 +438,65 @@ class TestApplySpillFormula:
         assert "Applied dynamic array formula" in result
         assert "K1:K3" in result
 
+    def test_batch_invalid_range_in_later_spec(self, test_excel_file, temp_excel_dir):
+        """Test that a reversed range in any spec rejects the whole batch"""
+        result = apply_spill_formulas_batch(
+            test_excel_file,
+            "Sheet",
+            [
+                ("D1", "D10", "=UNIQUE(A1:A10)"),
+                ("E5", "E1", "=SORT(A1:A10)"),
+            ]
+        )
+        
+        assert "Error: Invalid range specification" in result
+        assert "start_cell must be before end_cell" in result
+        # The first spec must not have been written either
+        ws = openpyxl.load_workbook(Path(temp_excel_dir) / test_excel_file)["Sheet"]
+        assert ws["D1"].value is None
+    
+    def test_batch_invalid_cell_reference(self, test_excel_file):
+        """Test batch error handling for invalid cell references"""
+        result = apply_spill_formulas_batch(
+            test_excel_file,
+            "Sheet",
+            [
+                ("D1", "D10", "=UNIQUE(A1:A10)"),
+                ("INVALID", "E5", "=SORT(A1:A10)"),
+            ]
+        )
+        
+        assert "Error: Invalid cell reference" in result
+    
+    def test_batch_invalid_sheet_name(self, test_excel_file):
+        """Test batch error handling for invalid sheet name"""
+        result = apply_spill_formulas_batch(
+            test_excel_file,
+            "InvalidSheet",
+            [("D1", "D10", "=UNIQUE(A1:A10)")]
+        )
+        
+        assert "Error: Sheet 'InvalidSheet' not found" in result
+    
+    def test_batch_without_openpyxl_spill(self, test_excel_file, monkeypatch):
+        """Test that a missing set_dynamic_array_formula is reported as such"""
+        monkeypatch.delattr(openpyxl.cell.cell.Cell, "set_dynamic_array_formula", raising=False)
+        result = apply_spill_formulas_batch(
+            test_excel_file, "Sheet", [("F3", "F9", "=UNIQUE(C3:C9)")]
+        )
+        assert "requires openpyxl-spill" in result
+    
+    def test_batch_unrelated_attribute_error(self, test_excel_file, monkeypatch):
+        """Test that other AttributeErrors are not mistaken for a missing library"""
+        def broken(self, ref):
+            raise AttributeError("'NoneType' object has no attribute 'ref'")
+        monkeypatch.setattr(openpyxl.cell.cell.Cell, "set_dynamic_array_formula", broken, raising=False)
+        result = apply_spill_formulas_batch(
+            test_excel_file, "Sheet", [("F3", "F9", "=UNIQUE(C3:C9)")]
+        )
+        assert result.startswith("Error applying spill formulas:")
+        assert "requires openpyxl-spill" not in result
+    
     def test_create_sample_with_spill_functions(self, temp_excel_dir):
         """Test creating Excel file with multiple spill functions similar to create_with_openpyxl.py"""
         
@@ -301,8 +507,12 @@ class TestApplySpillFormula:
         result = create_workbook(filename)
         assert "successfully" in result
         
+        # Write header, sample data and labels under a single load/save cycle
+        full_path = get_excel_path(filename)
+        wb = openpyxl.load_workbook(full_path)
+        
         # Write header
-        write_data_to_excel(filename, "Sheet", "A1", [["Date", "Sales", "Region"]])
+        write_data_to_excel(wb, "Sheet", "A1", [["Date", "Sales", "Region"]])
         
         # Write sample data
         data = [
@@ -314,35 +524,31 @@ class TestApplySpillFormula:
             [date(2024, 1, 6), 2500, 'South'],
             [date(2024, 1, 7), 1700, 'East'],
         ]
-        write_data_to_excel(filename, "Sheet", "A2", data)
+        write_data_to_excel(wb, "Sheet", "A2", data)
         
         # Add analysis header
-        write_data_to_excel(filename, "Sheet", "E1", [["Analysis with SPILL Functions"]])
-        
-        # 1. SORT - Top Sales (F3:F9)
-        write_data_to_excel(filename, "Sheet", "E3", [["Top Sales (Sorted):"]])
-        result = apply_spill_formula(filename, "Sheet", "F3", "F9", "=SORT(B2:B8,,-1)")
-        assert "Applied dynamic array formula" in result
+        write_data_to_excel(wb, "Sheet", "E1", [["Analysis with SPILL Functions"]])
         
-        # 2. UNIQUE - Unique Regions (F12:F14)
-        write_data_to_excel(filename, "Sheet", "E12", [["Unique Regions:"]])
-        result = apply_spill_formula(filename, "Sheet", "F12", "F14", "=UNIQUE(C2:C8)")
-        assert "Applied dynamic array formula" in result
-        
-        # 3. FILTER - North Sales (J3:J5)
-        write_data_to_excel(filename, "Sheet", "I3", [["North Sales:"]])
-        result = apply_spill_formula(filename, "Sheet", "J3", "J5", '=FILTER(B2:B8,C2:C8="North")')
-        assert "Applied dynamic array formula" in result
+        # Add section labels
+        write_data_to_excel(wb, "Sheet", "E3", [["Top Sales (Sorted):"]])
+        write_data_to_excel(wb, "Sheet", "E12", [["Unique Regions:"]])
+        write_data_to_excel(wb, "Sheet", "I3", [["North Sales:"]])
+        write_data_to_excel(wb, "Sheet", "A16", [["Sales > 2000:"]])
+        write_data_to_excel(wb, "Sheet", "D20", [["Numbers:"]])
         
-        # 4. FILTER - Sales > 2000 (A17:C19)
-        write_data_to_excel(filename, "Sheet", "A16", [["Sales > 2000:"]])
-        result = apply_spill_formula(filename, "Sheet", "A17", "C19", "=FILTER(A2:C8,B2:B8>2000)")
-        assert "Applied dynamic array formula" in result
+        wb.save(full_path)
         
-        # 5. SEQUENCE (E20:E26)
-        write_data_to_excel(filename, "Sheet", "D20", [["Numbers:"]])
-        result = apply_spill_formula(filename, "Sheet", "E20", "E26", "=SEQUENCE(7)")
-        assert "Applied dynamic array formula" in result
+        # Apply all spill formulas under a single load/save cycle
+        specs = [
+            ("F3", "F9", "=SORT(B2:B8,,-1)"),                   # 1. SORT - Top Sales
+            ("F12", "F14", "=UNIQUE(C2:C8)"),                   # 2. UNIQUE - Unique Regions
+            ("J3", "J5", '=FILTER(B2:B8,C2:C8="North")'),       # 3. FILTER - North Sales
+            ("A17", "C19", "=FILTER(A2:C8,B2:B8>2000)"),        # 4. FILTER - Sales > 2000
+            ("E20", "E26", "=SEQUENCE(7)"),                     # 5. SEQUENCE
+        ]
+        result = apply_spill_formulas_batch(filename, "Sheet", specs)
+        for start_cell, end_cell, formula in specs:
+            assert f"Applied dynamic array formula '{formula}' to range {start_cell}:{end_cell}" in result
         
         return filename
     
@@ -358,12 +564,15 @@ class TestApplySpillFormula:
         if not reference_path.exists():
             pytest.skip("Reference file openpyxl_spill.xlsx not found")
         
-        # Load both workbooks
-        test_wb = openpyxl.load_workbook(test_path, data_only=False)
-        ref_wb = openpyxl.load_workbook(reference_path, data_only=False)
+        # Load both workbooks read-only and collect their values in one pass
+        test_wb = openpyxl.load_workbook(test_path, read_only=True, data_only=False)
+        ref_wb = openpyxl.load_workbook(reference_path, read_only=True, data_only=False)
         
-        test_ws = test_wb.active
-        ref_ws = ref_wb.active
+        test_values = _read_cell_values(test_wb.active)
+        ref_values = _read_cell_values(ref_wb.active)
+        
+        test_wb.close()
+        ref_wb.close()
         
         # Compare key cells with formulas
         formula_cells = [
@@ -375,27 +584,24 @@ class TestApplySpillFormula:
         ]
         
         for cell_ref, expected_formula in formula_cells:
-            test_cell = test_ws[cell_ref]
-            ref_cell = ref_ws[cell_ref]
+            test_value = test_values.get(cell_ref)
             
             # Check if both have formulas
-            assert test_cell.value is not None, f"Test cell {cell_ref} should have a formula"
+            assert test_value is not None, f"Test cell {cell_ref} should have a formula"
             
             # Handle ArrayFormula objects
             from openpyxl.worksheet.formula import ArrayFormula
-            if isinstance(test_cell.value, ArrayFormula):
-                test_formula = test_cell.value.text
+            if isinstance(test_value, ArrayFormula):
+                test_formula = test_value.text
             else:
-                test_formula = str(test_cell.value)
+                test_formula = str(test_value)
             
             assert test_formula.startswith("="), f"Test cell {cell_ref} should contain a formula"
             
             # Compare formula content (normalize for comparison)
             # Remove Excel internal function prefixes
-            test_formula_normalized = test_formula.upper().replace(" ", "")
-            test_formula_normalized = test_formula_normalized.replace("=_XLFN._XLWS.", "=")
-            test_formula_normalized = test_formula_normalized.replace("=_XLFN.", "=")
-            expected_normalized = expected_formula.upper().replace(" ", "")
+            test_formula_normalized = _norm(test_formula)
+            expected_normalized = _norm(expected_formula)
             assert test_formula_normalized == expected_normalized, f"Formula mismatch in {cell_ref}: {test_formula_normalized} != {expected_normalized}"
         
         # Compare data cells
@@ -406,18 +612,106 @@ class TestApplySpillFormula:
         ]
         
         for cell_ref in data_cells:
-            test_value = test_ws[cell_ref].value
-            ref_value = ref_ws[cell_ref].value
+            test_value = test_values.get(cell_ref)
+            ref_value = ref_values.get(cell_ref)
             
             # For dates, compare date part only
             if isinstance(test_value, date) and isinstance(ref_value, date):
                 assert test_value.date() == ref_value.date() if hasattr(test_value, 'date') else test_value == ref_value
             else:
                 assert test_value == ref_value, f"Value mismatch in {cell_ref}: {test_value} != {ref_value}"
-        
-        test_wb.close()
-        ref_wb.close()
 
 
+
+class TestParseCellReference:
+    """Tests for excel_mcp.cell_utils.parse_cell_reference"""
+
+    def test_a1(self):
+        assert parse_cell_reference("A1") == (1, 1)
+
+    def test_multi_letter_column(self):
+        assert parse_cell_reference("AB12") == (12, 28)
+        assert parse_cell_reference("XFD1048576") == (1048576, 16384)
+
+    def test_lowercase(self):
+        assert parse_cell_reference("b3") == (3, 2)
+
+    @pytest.mark.parametrize("cell_ref", ["$D$1", "D$1", "ABCD1", "A", "1", "", "A1:B2", " A1"])
+    def test_invalid_reference_rejected(self, cell_ref):
+        with pytest.raises(ValueError, match="Invalid cell reference"):
+            parse_cell_reference(cell_ref)
+
+
+class TestServerApplySpillFormula:
+    """Tests for the apply_spill_formula tool in excel_mcp.server"""
+
+    @pytest.fixture
+    def server(self):
+        pytest.importorskip("mcp")
+        from excel_mcp import server
+        return server
+
+    def test_invalid_cell_reference_does_not_create_file(self, server, tmp_path):
+        filepath = str(tmp_path / "missing.xlsx")
+        result = server.apply_spill_formula(filepath, "Sheet", "$D$1", "D5", "=UNIQUE(A1:A10)")
+        assert result == "Error: Invalid cell reference"
+        assert not os.path.exists(filepath)
+
+    def test_invalid_range_does_not_create_file(self, server, tmp_path):
+        filepath = str(tmp_path / "missing.xlsx")
+        result = server.apply_spill_formula(filepath, "Sheet", "D5", "D1", "=UNIQUE(A1:A10)")
+        assert "Invalid range specification" in result
+        assert not os.path.exists(filepath)
+
+
+class TestWriteDataToExcel:
+    """Test suite for the write_data_to_excel helpers"""
+    
+    def test_write_at_a1_on_empty_sheet(self):
+        """Test writing from A1 on an empty sheet"""
+        wb = write_data_to_excel(Workbook(), "Sheet", "A1", [["x", "y"]])
+        
+        assert _read_cell_values(wb["Sheet"]) == {"A1": "x", "B1": "y"}
+    
+    def test_write_at_a2_on_empty_sheet(self):
+        """Test writing from A2 on an empty sheet keeps row 1 empty"""
+        wb = write_data_to_excel(Workbook(), "Sheet", "A2", [["x", "y"]])
+        
+        assert _read_cell_values(wb["Sheet"]) == {"A2": "x", "B2": "y"}
+    
+    def test_write_at_a2_on_new_sheet(self):
+        """Test writing from A2 on a sheet created by the helper"""
+        wb = write_data_to_excel(Workbook(), "New", "A2", [["x", "y"]])
+        
+        assert _read_cell_values(wb["New"]) == {"A2": "x", "B2": "y"}
+    
+    def test_append_below_existing_data(self):
+        """Test rows written directly below existing data (append fast path)"""
+        wb = write_data_to_excel(Workbook(), "Sheet", "A1", [["Name", "Score"]])
+        write_data_to_excel(wb, "Sheet", "A2", [["Alice", 85], ["Bob"]])
+        
+        assert _read_cell_values(wb["Sheet"]) == {
+            "A1": "Name", "B1": "Score",
+            "A2": "Alice", "B2": 85,
+            "A3": "Bob",
+        }
+    
+    def test_write_data_to_excel_path_round_trip(self, temp_excel_dir):
+        """Test writing data through the path-based wrapper and reading it back"""
+        filename = "test_write.xlsx"
+        assert "successfully" in create_workbook(filename)
+        
+        result = write_data_to_excel_path(filename, "Sheet", "B2", [["Name", "Score"], ["Alice", 85]])
+        assert result == "Data written successfully"
+        
+        ws = openpyxl.load_workbook(Path(temp_excel_dir) / filename)["Sheet"]
+        assert [[c.value for c in row] for row in ws["B2:C3"]] == [["Name", "Score"], ["Alice", 85]]
+    
+    def test_write_data_to_excel_path_missing_file(self, temp_excel_dir):
+        """Test error handling when the target workbook does not exist"""
+        result = write_data_to_excel_path("missing.xlsx", "Sheet", "A1", [["x"]])
+        
+        assert result.startswith("Error writing data:")
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file